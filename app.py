@@ -3,8 +3,12 @@ import uuid
 import plotly.graph_objects as go
 from datetime import datetime
 from src.agent import diabetes_agent
-from src.reports import generate_pdf_report
-from src.utils import extract_text_from_pdf
+from src.nodes import prefetch_analysis
+from src.speculation import discard_speculation
+from src.reports import generate_pdf_report, load_diet_plan, render_diet_plan_markdown
+from src.tools import run_risk_sensitivity
+from src.jobs import submit_pdf_job, get_job, get_job_text, cancel_job, start_workers, ACTIVE_STATUSES
+from src.blob_store import put_blob, resolve_blob, release_thread, maybe_collect_garbage
 
 # 1. Page Configuration
 st.set_page_config(
@@ -35,6 +39,47 @@ def create_risk_meter(probability_pct):
     fig.update_layout(height=280, margin=dict(l=20, r=20, t=50, b=20))
     return fig
 
+# What-If Sensitivity UI Component (Glucose x BMI heatmap around current metrics)
+def create_risk_sensitivity_chart(metrics):
+    sweep = run_risk_sensitivity(metrics)
+    if sweep is None:
+        return None
+    fig = go.Figure(go.Heatmap(
+        x = sweep["bmi"],
+        y = sweep["glucose"],
+        z = sweep["probability"],
+        zmin = 0, zmax = 100,
+        colorscale = [[0, "green"], [0.3, "yellow"], [0.7, "orange"], [1, "red"]],
+        colorbar = {'title': "Risk %"},
+        hovertemplate = "BMI %{x:.1f}<br>Glucose %{y:.0f}<br>Risk %{z:.1f}%<extra></extra>"
+    ))
+    # Mark the patient's current position on the grid
+    fig.add_trace(go.Scatter(
+        x = [metrics.get("bmi")], y = [metrics.get("glucose")],
+        mode = "markers", marker = {'color': "black", 'size': 12, 'symbol': "x"},
+        name = "You", showlegend = False
+    ))
+    fig.update_layout(
+        title = {'text': "What-If: Risk vs Glucose & BMI", 'font': {'size': 18}},
+        xaxis_title = "BMI", yaxis_title = "Glucose (mg/dL)",
+        height=280, margin=dict(l=20, r=20, t=50, b=20)
+    )
+    return fig
+
+# PDF Job Progress UI Component (re-runs on its own every second while the job is active)
+@st.fragment(run_every=1)
+def pdf_job_progress(job_id):
+    job = get_job(job_id)
+    if not job or job["status"] not in ACTIVE_STATUSES:
+        # Finished: a full rerun lets the sidebar hand the text to the graph
+        st.rerun()
+    if job["pages_total"]:
+        st.progress(job["pages_done"] / job["pages_total"], text=f"Reading page {job['pages_done']}/{job['pages_total']}...")
+    else:
+        st.progress(0, text="Queued for processing..." if job["status"] == "queued" else "Opening document...")
+    if st.button("✖ Cancel Processing"):
+        cancel_job(job_id)
+
 # 3. Session State Initialization
 if "messages" not in st.session_state:
     st.session_state.messages = [{
@@ -46,6 +91,11 @@ if "thread_id" not in st.session_state:
 
 config = {"configurable": {"thread_id": st.session_state.thread_id}}
 
+# Reclaim report/plan blobs from expired threads (throttled per process)
+maybe_collect_garbage()
+# Make sure this process is draining the persistent PDF job queue
+start_workers()
+
 # Refresh current agent state to display updated metrics in sidebar
 state_snapshot = diabetes_agent.get_state(config)
 m = state_snapshot.values.get("metrics", {}) if state_snapshot.values else {}
@@ -54,6 +104,8 @@ m = state_snapshot.values.get("metrics", {}) if state_snapshot.values else {}
 with st.sidebar:
     st.title("🛡️ Agent Control Center")
     if st.button("🔄 Reset Conversation"):
+        discard_speculation(st.session_state.thread_id)
+        release_thread(st.session_state.thread_id)
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.rerun()
@@ -61,37 +113,54 @@ with st.sidebar:
     st.subheader("📄 Upload Lab Report")
     uploaded_file = st.file_uploader("Upload PDF Report", type=['pdf'], key="pdf_uploader")
     
-    # PDF Processing Pipeline
+    # PDF Processing Pipeline: extraction runs as a background job (src/jobs.py);
+    # this script only polls it and hands the text to the graph once it's done
     if uploaded_file and "file_processed" not in st.session_state:
-        with st.spinner("Analyzing Document (Running Multi-Engine Extraction)..."):
-            try:
-                file_bytes = uploaded_file.read()
-                raw_text = extract_text_from_pdf(file_bytes)
-                
-                # Check for empty/scanned PDF that failed all engines
-                if not raw_text or len(raw_text.strip()) == 0:
-                    st.error("⚠️ This PDF appears to be a scanned image or an unsupported format.")
-                    st.info("Please **type your metrics** (Age, Glucose, BMI) directly into the chat below!")
-                    st.session_state.file_processed = True
-                else:
-                    # 1. Update Graph State with extracted text
-                    diabetes_agent.update_state(config, {"report_text": raw_text})
-                    
-                    # 2. Run the graph to trigger the parser_node
-                    inputs = {"messages": [("user", "I've uploaded a report. Please extract my data.")]}
-                    final_chunk = None
-                    for chunk in diabetes_agent.stream(inputs, config=config, stream_mode="values"):
-                        final_chunk = chunk
-                    
-                    # 3. Add Parser's response to chat
-                    if final_chunk and final_chunk.get("messages"):
-                        st.session_state.messages.append({"role": "assistant", "content": final_chunk["messages"][-1].content})
-                    
-                    st.session_state.file_processed = True
-                    st.rerun()
-            except Exception as e:
-                st.error(f"Error processing PDF: {str(e)}")
-                st.session_state.file_processed = True
+        if "pdf_job_id" not in st.session_state:
+            st.session_state.pdf_job_id = submit_pdf_job(uploaded_file.getvalue())
+        job = get_job(st.session_state.pdf_job_id)
+
+        if job and job["status"] in ACTIVE_STATUSES:
+            pdf_job_progress(st.session_state.pdf_job_id)
+        else:
+            job_id = st.session_state.pop("pdf_job_id")
+            st.session_state.file_processed = True
+            if not job or job["status"] == "failed":
+                st.error(f"Error processing PDF: {job['error'] if job else 'job not found'}")
+            elif job["status"] == "cancelled":
+                st.info("PDF processing cancelled. You can **type your metrics** in the chat instead.")
+            else:
+                with st.spinner("Extracting your metrics from the report..."):
+                    try:
+                        raw_text = get_job_text(job_id)
+                        if raw_text is None:
+                            # The finished job expired between polling and reading; extract again
+                            st.session_state.pdf_job_id = submit_pdf_job(uploaded_file.getvalue())
+                            del st.session_state.file_processed
+                            st.rerun()
+                        
+                        # Check for empty/scanned PDF that failed all engines
+                        if not raw_text or len(raw_text.strip()) == 0:
+                            st.error("⚠️ This PDF appears to be a scanned image or an unsupported format.")
+                            st.info("Please **type your metrics** (Age, Glucose, BMI) directly into the chat below!")
+                        else:
+                            # 1. Update Graph State with a reference to the extracted text
+                            report_ref = put_blob(raw_text, st.session_state.thread_id)
+                            diabetes_agent.update_state(config, {"report_text": report_ref})
+                            
+                            # 2. Run the graph to trigger the parser_node
+                            inputs = {"messages": [("user", "I've uploaded a report. Please extract my data.")]}
+                            final_chunk = None
+                            for chunk in diabetes_agent.stream(inputs, config=config, stream_mode="values"):
+                                final_chunk = chunk
+                            
+                            # 3. Add Parser's response to chat
+                            if final_chunk and final_chunk.get("messages"):
+                                st.session_state.messages.append({"role": "assistant", "content": final_chunk["messages"][-1].content})
+                            
+                            st.rerun()
+                    except Exception as e:
+                        st.error(f"Error processing PDF: {str(e)}")
 
     st.markdown("---")
     st.subheader("📋 Recorded Metrics")
@@ -118,7 +187,15 @@ for i, message in enumerate(st.session_state.messages):
         st.markdown(message["content"])
         if "metadata" in message and "PROB_VAL:" in message["metadata"]:
             prob = float(message["metadata"].split(":")[1])
-            st.plotly_chart(create_risk_meter(prob), use_container_width=True, key=f"hist_chart_{i}")
+            sweep_fig = create_risk_sensitivity_chart(message["metrics"]) if message.get("metrics") else None
+            if sweep_fig is None:
+                st.plotly_chart(create_risk_meter(prob), use_container_width=True, key=f"hist_chart_{i}")
+            else:
+                meter_col, sweep_col = st.columns(2)
+                with meter_col:
+                    st.plotly_chart(create_risk_meter(prob), use_container_width=True, key=f"hist_chart_{i}")
+                with sweep_col:
+                    st.plotly_chart(sweep_fig, use_container_width=True, key=f"sweep_chart_{i}")
 
 # 6. Chat Input Handler
 if prompt := st.chat_input("Type your metrics or ask a question..."):
@@ -146,12 +223,23 @@ if state_snapshot.next and "predict" in state_snapshot.next:
         st.warning("⚠️ **Review Extracted Data**")
         st.write("The system has identified the following metrics. Please confirm to generate your ML prediction and **7-day Indian Vegetarian plan**:")
         st.info(f"**Age:** {m.get('age')} | **Glucose:** {m.get('glucose')} | **BMI:** {m.get('bmi')}")
+
+        # Speculatively run prediction + retrieval while the user reviews the metrics
+        prefetch_analysis(st.session_state.thread_id, m)
         
         if st.button("✅ Confirm & Run Analysis"):
             with st.spinner("Generating clinical assessment and vegetarian diet plan..."):
                 current_prob, final_res, diet_plan, final_msg = None, "", "", ""
+                plan_placeholder, finished_days = st.empty(), {}
                 # Resume execution from the interrupt
-                for chunk in diabetes_agent.stream(None, config=config, stream_mode="values"):
+                for mode, chunk in diabetes_agent.stream(None, config=config, stream_mode=["values", "custom"]):
+                    if mode == "custom":
+                        # Partial plan: show each day as soon as the planner finishes it
+                        if "plan_day" in chunk:
+                            finished_days[chunk["day_index"]] = chunk["plan_day"]
+                            partial = {"days": [finished_days[i] for i in sorted(finished_days)]}
+                            plan_placeholder.markdown(render_diet_plan_markdown(partial))
+                        continue
                     if "messages" in chunk:
                         final_msg = chunk["messages"][-1].content
                     if "prediction_result" in chunk:
@@ -161,12 +249,12 @@ if state_snapshot.next and "predict" in state_snapshot.next:
                             current_prob = float(final_res.split("(")[1].split("%")[0])
                         except: pass
                     if "diet_plan" in chunk:
-                        diet_plan = chunk["diet_plan"]
+                        diet_plan = load_diet_plan(resolve_blob(chunk["diet_plan"]))
 
                 # Save all final state to session for the Export button and UI
                 st.session_state.final_report_data = {
                     "metrics": m, "result": final_res, "advice": final_msg, "diet_plan": diet_plan
                 }
                 metadata = f"PROB_VAL:{current_prob}" if current_prob is not None else ""
-                st.session_state.messages.append({"role": "assistant", "content": final_msg, "metadata": metadata})
+                st.session_state.messages.append({"role": "assistant", "content": final_msg, "metadata": metadata, "metrics": dict(m)})
                 st.rerun()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import time
+import argparse
+import numpy as np
+from src.embeddings import create_embeddings, OnnxMiniLMEmbeddings
+
+# Parity + speed check: torch (HuggingFaceEmbeddings) vs int8 ONNX backend.
+#   python benchmark_embeddings.py [--min-cosine 0.98]
+
+DATA_PATH = "data"
+
+def load_chunks():
+    """The same chunks ingest.py indexes, so throughput reflects a real ingest."""
+    from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    documents = DirectoryLoader(DATA_PATH, glob="*.pdf", loader_cls=PyPDFLoader).load()
+    texts = RecursiveCharacterTextSplitter(chunk_size=700, chunk_overlap=70).split_documents(documents)
+    return [t.page_content for t in texts]
+
+QUERIES = [
+    "Indian vegetarian diet guidelines and Glycemic Index for glucose level 140",
+    "Glycemic index of ragi and jowar",
+    "Low GI breakfast options for diabetics",
+    "Is brown rice better than white rice for blood sugar",
+]
+
+def time_ingest(embeddings, chunks):
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(chunks))
+    return vectors, len(chunks) / (time.perf_counter() - start)
+
+def time_queries(embeddings, repeats=20):
+    # Distinct strings so the ONNX query cache doesn't flatter the numbers
+    latencies = []
+    for r in range(repeats):
+        for q in QUERIES:
+            start = time.perf_counter()
+            embeddings.embed_query(f"{q} ({r})")
+            latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    chunks = load_chunks()
+    print(f"📄 {len(chunks)} chunks from '{DATA_PATH}'")
+
+    results = {}
+    for backend in ["torch", "onnx"]:
+        # Build the ONNX backend directly: create_embeddings would silently fall back to torch
+        embeddings = OnnxMiniLMEmbeddings() if backend == "onnx" else create_embeddings("torch")
+        vectors, docs_per_s = time_ingest(embeddings, chunks)
+        p50, p95 = time_queries(embeddings)
+        results[backend] = vectors
+        print(f"⚙️ {backend:5s} | ingest {docs_per_s:7.1f} chunks/s | query p50 {p50:6.2f} ms, p95 {p95:6.2f} ms")
+
+    # Both backends emit L2-normalized vectors, so the row-wise dot product is the cosine
+    cosine = (results["torch"] * results["onnx"]).sum(axis=1)
+    print(f"🎯 Parity: cosine mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    if cosine.min() < args.min_cosine:
+        raise SystemExit(f"❌ Parity below {args.min_cosine}: re-export or keep EMBEDDING_BACKEND=torch")
+    print("✅ ONNX embeddings match the torch index")
+
+if __name__ == "__main__":
+    main()
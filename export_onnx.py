@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+from src.embeddings import MODEL_NAME, ONNX_MODEL_DIR, ONNX_MODEL_FILE
+
+# One-off export step (needs torch + transformers + onnxruntime on the build machine).
+# Serving with EMBEDDING_BACKEND=onnx afterwards only needs onnxruntime + tokenizers.
+
+def _wrap_encoder(model):
+    import torch
+
+    class EncoderForExport(torch.nn.Module):
+        """Fixed positional signature + plain tensor output, independent of the transformers version."""
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.encoder(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    return EncoderForExport(model)
+
+def export_onnx_model(output_dir=ONNX_MODEL_DIR):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = output_dir / "model.onnx"
+
+    # 1️⃣ Load the same weights the torch backend uses
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME).eval()
+    tokenizer.save_pretrained(output_dir)   # writes tokenizer.json for the `tokenizers` runtime
+
+    # 2️⃣ Export with dynamic batch + sequence axes (padding is decided per batch at runtime)
+    inputs = tokenizer(["export sample"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            _wrap_encoder(model),
+            tuple(inputs[n] for n in names),
+            str(fp32_path),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=14,
+            dynamo=False,   # TorchScript exporter: handles dynamic_axes without onnxscript
+        )
+
+    # 3️⃣ Dynamic int8 quantization of the weights (activations stay float)
+    int8_path = output_dir / ONNX_MODEL_FILE
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+
+    size_mb = lambda p: os.path.getsize(p) / 1e6
+    print(f"✅ Exported {fp32_path} ({size_mb(fp32_path):.1f} MB) -> {int8_path} ({size_mb(int8_path):.1f} MB)")
+    print("Run `python benchmark_embeddings.py` to check parity with the torch embeddings.")
+
+if __name__ == "__main__":
+    export_onnx_model()
@@ -42,8 +42,8 @@
 import os
 from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
+from src.embeddings import create_embeddings
 
 # Set your custom cache directory (for local model storage)
 os.environ["HF_HOME"] = "D:/huggingface_cache"
@@ -54,8 +54,8 @@ DB_PATH = "./chroma_db"     # Where vector DB will be stored
 def build_vector_db():
 
     # 1️⃣ Initialize embedding model (runs locally after first download)
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
+    # EMBEDDING_BACKEND=onnx uses the int8 ONNX export instead of PyTorch
+    embeddings = create_embeddings(
         model_kwargs={"local_files_only": False}  # change to True after first download if you want strict offline
     )
 
@@ -0,0 +1,187 @@
+import os
+import gc
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prefork serving mode:
+#   python serve.py --workers 4 --base-port 8501 --health-port 8600
+#
+# The parent loads the read-only artifacts (Random Forest pickle, MiniLM weights)
+# once, optionally warms the Chroma index files in the page cache, freezes the
+# loaded objects out of the GC, then forks
+# one Streamlit server per port. Workers inherit those pages copy-on-write, so
+# each extra worker only costs its private session memory.
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Tokenizer thread pools don't survive fork; let each worker start its own
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+workers = {}   # pid -> port
+
+
+def preload_shared_resources(share_index=False):
+    """Loads the read-only artifacts in the parent before forking."""
+    # Importing tools unpickles the model + scaler at module level
+    from src import tools
+    print(f"✅ Model loaded: {tools.diabetes_model is not None}")
+
+    tools.get_embeddings()
+    print("✅ MiniLM embedding weights loaded")
+
+    if share_index:
+        # SQLite connections (and Chroma's client threads) must not cross fork(), so the
+        # parent never opens the client; it only warms the OS page cache with the index
+        # files, which every worker then reads from when it opens its own client.
+        warmed = warm_page_cache(tools.DB_DIR)
+        if warmed:
+            print(f"✅ Chroma index files in page cache ({warmed / 1e6:.1f} MB)")
+
+    # Move everything allocated so far into the permanent generation so the
+    # cyclic GC never writes to (and un-shares) these pages in the workers
+    gc.collect()
+    gc.freeze()
+
+
+def warm_page_cache(directory):
+    """Reads every file under `directory` once so it is resident in the shared page cache."""
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                with open(path, "rb") as f:
+                    if hasattr(os, "posix_fadvise"):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                    while chunk := f.read(1 << 20):
+                        total += len(chunk)
+            except OSError as e:
+                print(f"⚠️ Could not pre-read {path}: {e}")
+    return total
+
+
+def read_memory_stats(pid):
+    """Shared vs private memory (kB) for a process, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def is_listening(port):
+    """True if something accepts TCP connections on localhost:`port`."""
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def health_report():
+    report = {"parent": {"pid": os.getpid(), "memory": read_memory_stats(os.getpid())}, "workers": []}
+    for pid, port in sorted(workers.items(), key=lambda w: w[1]):
+        report["workers"].append({"pid": pid, "port": port, "listening": is_listening(port), "memory": read_memory_stats(pid)})
+    return report
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(health_report(), indent=2).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_worker(port):
+    """Child process body: serve app.py with Streamlit on `port`."""
+    from streamlit.web import bootstrap
+    opts = {"server_port": port, "server_headless": True}
+    # Like `streamlit run`: bootstrap.run only hands flag_options to the config
+    # watchers, so they have to be applied to the config here first
+    bootstrap.load_config_options(flag_options=opts)
+    bootstrap.run(APP_SCRIPT, False, [], opts)
+
+
+def spawn_worker(port):
+    pid = os.fork()
+    if pid == 0:
+        # Respawned children would otherwise inherit the supervisor's handlers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            run_worker(port)
+        finally:
+            os._exit(0)
+    workers[pid] = port
+    print(f"🚀 Worker {pid} serving on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork Streamlit workers sharing one copy of the model and index.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=8501)
+    parser.add_argument("--health-port", type=int, default=8600)
+    parser.add_argument("--share-index", action="store_true",
+                        help="Pre-read the Chroma index files into the page cache before forking")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("❌ Prefork mode needs os.fork (Linux/macOS). Use `streamlit run app.py` instead.")
+
+    # 1️⃣ Load shared artifacts once
+    preload_shared_resources(share_index=args.share_index)
+
+    # 2️⃣ Fork workers (they inherit the loaded artifacts copy-on-write)
+    for i in range(args.workers):
+        spawn_worker(args.base_port + i)
+
+    # 3️⃣ Health check: GET http://localhost:<health-port>/ -> per-worker port status + shared/private memory
+    server = ThreadingHTTPServer(("127.0.0.1", args.health_port), HealthHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"🩺 Health check on http://127.0.0.1:{args.health_port}/")
+
+    def shutdown(signum, frame):
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # 4️⃣ Supervise: restart any worker that exits, reusing its port
+    while True:
+        pid, status = os.wait()
+        port = workers.pop(pid, None)
+        if port is not None:
+            print(f"⚠️ Worker {pid} on port {port} exited ({status}), restarting")
+            time.sleep(1)
+            spawn_worker(port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import time
+import shutil
+import threading
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+# --- Configuration ---
+# Large payloads (report text, diet plans) live here instead of in the graph
+# checkpoints; AgentState only carries a "blob:sha256:<hash>" reference.
+BLOB_DIR = Path(os.getenv("BLOB_STORE_DIR", "./blob_store"))
+BLOB_PREFIX = "blob:sha256:"
+THREAD_TTL_SECONDS = int(os.getenv("BLOB_THREAD_TTL_SECONDS", 24 * 3600))
+GC_INTERVAL_SECONDS = 15 * 60
+
+_last_gc = 0.0
+_gc_lock = threading.Lock()
+
+# Layout:
+#   objects/<h[:2]>/<h>      -> content, written once and shared by every thread
+#   threads/<tid>/<h>        -> empty marker: thread <tid> references blob <h>
+def _object_path(digest: str) -> Path:
+    return BLOB_DIR / "objects" / digest[:2] / digest
+
+def _thread_dir(thread_id: str) -> Path:
+    # Hash the thread id so arbitrary ids can't escape the store directory
+    return BLOB_DIR / "threads" / hashlib.sha256(str(thread_id).encode()).hexdigest()[:32]
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith(BLOB_PREFIX)
+
+def put_blob(text: str, thread_id: str) -> str:
+    """Stores text once per unique content and returns a reference owned by `thread_id`."""
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+
+    # Record the reference first so a concurrent GC never sees an orphan
+    thread_dir = _thread_dir(thread_id)
+    thread_dir.mkdir(parents=True, exist_ok=True)
+    (thread_dir / digest).touch()
+    os.utime(thread_dir)
+
+    path = _object_path(digest)
+    try:
+        # Already stored: just refresh its mtime so a concurrent GC pass skips it
+        os.utime(path)
+    except FileNotFoundError:
+        # New content, or a GC in another process unlinked it after we looked
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    return f"{BLOB_PREFIX}{digest}"
+
+def resolve_blob(value) -> Optional[str]:
+    """Returns the text behind a blob reference. Plain strings and None pass through unchanged."""
+    if not is_blob_ref(value):
+        return value
+    try:
+        return _object_path(value[len(BLOB_PREFIX):]).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        print(f"[ERROR blob_store] Missing blob for {value}")
+        return None
+
+def release_thread(thread_id: str):
+    """Drops every reference held by a thread. Blobs are reclaimed on the next GC pass."""
+    shutil.rmtree(_thread_dir(thread_id), ignore_errors=True)
+
+def collect_garbage(ttl_seconds: int = THREAD_TTL_SECONDS) -> int:
+    """
+    Expires threads idle for longer than `ttl_seconds`, then deletes blobs no live
+    thread references. Returns the number of blobs removed.
+    """
+    now = time.time()
+    threads_root, objects_root = BLOB_DIR / "threads", BLOB_DIR / "objects"
+
+    # Paths can vanish mid-scan (release_thread, or a GC pass in another process);
+    # anything already gone counts as collected
+    live = set()
+    if threads_root.exists():
+        for thread_dir in threads_root.iterdir():
+            try:
+                if now - thread_dir.stat().st_mtime > ttl_seconds:
+                    shutil.rmtree(thread_dir, ignore_errors=True)
+                    continue
+                live.update(marker.name for marker in thread_dir.iterdir())
+            except FileNotFoundError:
+                continue
+
+    removed = 0
+    if objects_root.exists():
+        for path in objects_root.glob("*/*"):
+            # Skip temp files and anything written after the scan above started
+            try:
+                if path.name in live or path.suffix == ".tmp" or path.stat().st_mtime >= now:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+    if removed:
+        print(f"[DEBUG blob_store] Collected {removed} unreferenced blobs")
+    return removed
+
+def maybe_collect_garbage():
+    """Runs collect_garbage at most once per GC_INTERVAL_SECONDS in this process."""
+    global _last_gc
+    with _gc_lock:
+        if time.time() - _last_gc < GC_INTERVAL_SECONDS:
+            return
+        _last_gc = time.time()
+    try:
+        collect_garbage()
+    except OSError as e:
+        print(f"[ERROR blob_store] GC pass failed: {e}")
@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# ONNX CPU backend (optional): no PyTorch needed at serving time
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+# --- Configuration ---
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# "torch" (HuggingFaceEmbeddings) or "onnx" (int8-quantized export, see export_onnx.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./models/all-MiniLM-L6-v2-onnx")
+ONNX_MODEL_FILE = "model_int8.onnx"
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 on onnxruntime (int8). Reproduces the sentence-transformers
+    pipeline: mean pooling over the attention mask, then L2 normalization.
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, batch_size=32, max_length=256, query_cache_size=1024):
+        if ort is None or Tokenizer is None:
+            raise ImportError("ONNX backend needs `pip install onnxruntime tokenizers`")
+        model_dir = Path(model_dir)
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        # No fixed length: each batch is padded only to its own longest sequence
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_dir / ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.batch_size = batch_size
+        self._query_cache = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._cache_lock = threading.Lock()
+
+    def _encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+        token_embeddings = self.session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        # Length-sorted batches keep padding waste low; results go back in input order
+        order = np.argsort([len(t) for t in texts])
+        vectors = None
+        for start in range(0, len(texts), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            batch = self._encode([texts[i] for i in idx])
+            if vectors is None:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[idx] = batch
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        # Bounded LRU cache: guideline queries repeat a lot across sessions
+        with self._cache_lock:
+            if text in self._query_cache:
+                self._query_cache.move_to_end(text)
+                return self._query_cache[text]
+        vector = self._encode([text])[0].tolist()
+        with self._cache_lock:
+            self._query_cache[text] = vector
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return vector
+
+
+def create_embeddings(backend=EMBEDDING_BACKEND, **hf_kwargs):
+    """Builds the MiniLM embedding model for the configured backend (torch unless EMBEDDING_BACKEND=onnx)."""
+    if backend == "onnx":
+        try:
+            return OnnxMiniLMEmbeddings()
+        except Exception as e:
+            print(f"[ERROR embeddings] ONNX backend unavailable ({e}); falling back to torch. Run export_onnx.py first.")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=MODEL_NAME, **hf_kwargs)
@@ -0,0 +1,270 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+from src.utils import extract_text_from_pdf, ExtractionCancelled
+from src.blob_store import THREAD_TTL_SECONDS
+
+# --- Background PDF Processing ---
+# Uploaded PDFs are queued here instead of being extracted inside the Streamlit
+# script run. The queue lives in SQLite so it survives restarts and is shared by
+# every process on the host (serve.py workers included). Job ids are the SHA-256
+# of the file, so re-uploading the same report reuses the existing job/result.
+# PDFs are deleted once a job finishes; the extracted text is kept so repeat
+# uploads skip extraction, and finished jobs (with their files) expire after
+# JOB_TTL_SECONDS without use.
+
+JOBS_DIR = Path(os.getenv("PDF_JOBS_DIR", "./pdf_jobs"))
+NUM_WORKERS = int(os.getenv("PDF_JOB_WORKERS", 2))
+STALE_RUNNING_SECONDS = 10 * 60   # a 'running' job not updated for this long is requeued
+POLL_SECONDS = 1.0
+# Same lifetime as the blob store's idle threads unless overridden
+JOB_TTL_SECONDS = int(os.getenv("PDF_JOB_TTL_SECONDS", THREAD_TTL_SECONDS))
+EXPIRE_INTERVAL_SECONDS = 15 * 60
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_workers_started = False
+_start_lock = threading.Lock()
+_wakeup = threading.Event()
+_last_expiry = 0.0
+_expiry_lock = threading.Lock()
+
+
+def _connect():
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DIR / "jobs.db", timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            pages_total INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            attempt INTEGER NOT NULL DEFAULT 0,
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        )
+    """)
+    # Databases created before the attempt column existed
+    if "attempt" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+        try:
+            conn.execute("ALTER TABLE jobs ADD COLUMN attempt INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass   # another process added it first
+    return conn
+
+
+@contextmanager
+def _write_lock(conn):
+    """
+    Holds the database write lock for the block. Row changes that also touch the
+    job's PDF go through here so no other process can re-queue the job in between.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _pdf_path(job_id):
+    return JOBS_DIR / f"{job_id}.pdf"
+
+
+def _text_path(job_id):
+    return JOBS_DIR / f"{job_id}.txt"
+
+
+def submit_pdf_job(file_bytes: bytes) -> str:
+    """Queues a PDF for extraction and returns its job id (deduplicated by file hash)."""
+    job_id = hashlib.sha256(file_bytes).hexdigest()
+    now = time.time()
+    with closing(_connect()) as conn, _write_lock(conn):
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and (row["status"] in ACTIVE_STATUSES or (row["status"] == "done" and _text_path(job_id).exists())):
+            print(f"[DEBUG jobs] Reusing {row['status']} job {job_id[:12]}")
+            if row["status"] == "done":
+                # Each reuse restarts the expiry clock for the stored text
+                conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (now, job_id))
+        else:
+            pdf_path = _pdf_path(job_id)
+            tmp = pdf_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(file_bytes)
+            os.replace(tmp, pdf_path)
+            # New file, or a failed/cancelled one being retried
+            conn.execute("""
+                INSERT INTO jobs (id, status, created, updated) VALUES (?, 'queued', ?, ?)
+                ON CONFLICT(id) DO UPDATE SET status = 'queued', pages_done = 0, pages_total = 0,
+                                              error = NULL, updated = excluded.updated
+            """, (job_id, now, now))
+    start_workers()
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id: str):
+    """Returns {'id', 'status', 'pages_done', 'pages_total', 'error'} or None."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_job_text(job_id: str):
+    """Returns the extracted text of a done job, or None if it has since expired."""
+    try:
+        return _text_path(job_id).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def cancel_job(job_id: str):
+    """Cancels a queued job immediately; a running job stops at its next page."""
+    with closing(_connect()) as conn, _write_lock(conn):
+        now = time.time()
+        # Queued jobs never reach a worker, so their PDF is removed here
+        if conn.execute(
+            "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status = 'queued'",
+            (now, job_id),
+        ).rowcount:
+            _pdf_path(job_id).unlink(missing_ok=True)
+            return
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status = 'running'",
+            (now, job_id),
+        )
+
+
+def _claim_next_job(conn):
+    now = time.time()
+    # Jobs left 'running' by a crashed process go back in the queue
+    conn.execute(
+        "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND updated < ?",
+        (now - STALE_RUNNING_SECONDS,),
+    )
+    row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+    if not row:
+        return None
+    # Conditional update: only one worker (in any process) wins the claim. The
+    # bumped attempt number is the claim token; a worker whose token is stale
+    # (job cancelled and resubmitted, or requeued as stale) must stop touching the row.
+    with _write_lock(conn):
+        claimed = conn.execute(
+            "UPDATE jobs SET status = 'running', attempt = attempt + 1, updated = ? WHERE id = ? AND status = 'queued'",
+            (now, row["id"]),
+        ).rowcount
+        if not claimed:
+            return None
+        attempt = conn.execute("SELECT attempt FROM jobs WHERE id = ?", (row["id"],)).fetchone()["attempt"]
+    return row["id"], attempt
+
+
+def _run_job(conn, job_id, attempt):
+    def on_page(done, total):
+        # Stops on cancellation and when another claim has taken the job over
+        if not conn.execute(
+            "UPDATE jobs SET pages_done = ?, pages_total = ?, updated = ? WHERE id = ? AND status = 'running' AND attempt = ?",
+            (done, total, time.time(), job_id, attempt),
+        ).rowcount:
+            raise ExtractionCancelled(job_id)
+
+    def finish(status, error=None):
+        # Only the current claim may record the outcome and remove the PDF (a retry re-uploads it)
+        with _write_lock(conn):
+            if status == "cancelled":
+                owned = conn.execute(
+                    "SELECT 1 FROM jobs WHERE id = ? AND status = 'cancelled' AND attempt = ?", (job_id, attempt)
+                ).fetchone()
+            else:
+                owned = conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ? AND status = 'running' AND attempt = ?",
+                    (status, error, time.time(), job_id, attempt),
+                ).rowcount
+            if owned:
+                _pdf_path(job_id).unlink(missing_ok=True)
+
+    try:
+        text = extract_text_from_pdf(_pdf_path(job_id).read_bytes(), on_page=on_page)
+        _text_path(job_id).write_text(text, encoding="utf-8")
+        finish("done")
+    except ExtractionCancelled:
+        print(f"[DEBUG jobs] Job {job_id[:12]} (attempt {attempt}) cancelled or superseded")
+        finish("cancelled")
+    except Exception as e:
+        print(f"[ERROR jobs] Job {job_id[:12]} failed: {e}")
+        finish("failed", str(e))
+
+
+def expire_jobs(ttl_seconds: int = JOB_TTL_SECONDS) -> int:
+    """
+    Deletes finished/cancelled/failed jobs not updated for `ttl_seconds`, then any
+    .pdf/.txt/.tmp file older than that which no remaining job owns. Returns the
+    number of rows removed.
+    """
+    cutoff = time.time() - ttl_seconds
+    with closing(_connect()) as conn:
+        removed = conn.execute(
+            "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated < ?",
+            (*ACTIVE_STATUSES, cutoff),
+        ).rowcount
+        live = {row["id"] for row in conn.execute("SELECT id FROM jobs")}
+
+    for path in JOBS_DIR.iterdir():
+        if path.suffix not in (".pdf", ".txt", ".tmp") or path.name.split(".")[0] in live:
+            continue
+        # The mtime check skips files a concurrent submit_pdf_job just wrote
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+    if removed:
+        print(f"[DEBUG jobs] Expired {removed} PDF jobs")
+    return removed
+
+
+def maybe_expire_jobs():
+    """Runs expire_jobs at most once per EXPIRE_INTERVAL_SECONDS in this process."""
+    global _last_expiry
+    with _expiry_lock:
+        if time.time() - _last_expiry < EXPIRE_INTERVAL_SECONDS:
+            return
+        _last_expiry = time.time()
+    try:
+        expire_jobs()
+    except (sqlite3.OperationalError, OSError) as e:
+        print(f"[ERROR jobs] Expiry pass failed: {e}")
+
+
+def _worker_loop():
+    conn = _connect()
+    while True:
+        try:
+            claim = _claim_next_job(conn)
+        except sqlite3.OperationalError as e:
+            print(f"[ERROR jobs] Queue unavailable: {e}")
+            claim = None
+        if claim is None:
+            maybe_expire_jobs()
+            _wakeup.wait(POLL_SECONDS)
+            _wakeup.clear()
+            continue
+        _run_job(conn, *claim)
+
+
+def start_workers():
+    """Starts this process's worker threads once (lazily, so forked workers start their own)."""
+    global _workers_started
+    with _start_lock:
+        if _workers_started:
+            return
+        for i in range(NUM_WORKERS):
+            threading.Thread(target=_worker_loop, name=f"pdf-job-{i}", daemon=True).start()
+        _workers_started = True
@@ -1,9 +1,16 @@
 import os
+import re
 from dotenv import load_dotenv
 from src.state import AgentState
 # Added lookup_medical_guidelines to imports
 from src.tools import run_diabetes_prediction, search_tool, lookup_medical_guidelines
+from src.utils import select_relevant_sections, fields_dropped_by_pruning, REPORT_TOKEN_BUDGET
+from src.blob_store import put_blob, resolve_blob
+from src.speculation import start_speculation, get_speculation, discard_speculation
+from src.reports import MEAL_SLOTS, dump_diet_plan, render_diet_plan_markdown
 from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -16,6 +23,14 @@ class ExtractionSchema(BaseModel):
     glucose: Optional[int] = Field(None, description="Blood glucose/sugar level")
     bmi: Optional[float] = Field(None, description="Body Mass Index")
 
+# 2b. Diet Plan Schema (one day of the structured 7-day plan)
+class DayPlanSchema(BaseModel):
+    breakfast: str = Field(..., description="Indian vegetarian breakfast")
+    lunch: str = Field(..., description="Indian vegetarian lunch")
+    dinner: str = Field(..., description="Indian vegetarian dinner")
+    snacks: str = Field(..., description="Low-GI snacks for the day")
+    justification: str = Field(..., description="One meal choice justified from the clinical guidelines, e.g. its Glycemic Index")
+
 # 3. LLM Setup
 llm = ChatOpenAI(
     model="gpt-4o",
@@ -24,11 +39,40 @@ llm = ChatOpenAI(
     temperature=0.2, 
 )
 
+# Token budget for the report sections sent to the extraction prompt
+report_token_budget = int(os.getenv("REPORT_TOKEN_BUDGET", REPORT_TOKEN_BUDGET))
+
+# Also draft the diet plan (an LLM call) speculatively during the HITL pause
+speculative_plan = os.getenv("SPECULATIVE_PLAN", "false").lower() in ("1", "true", "yes")
+
+# "parallel": structured plan, one concurrent LLM call per day (default)
+# "single": the whole week as one Markdown table in a single completion
+planner_mode = os.getenv("PLANNER_MODE", "parallel").lower()
+
+# Each day is anchored on a different grain + protein so concurrent calls stay varied
+DAY_THEMES = [
+    ("Ragi", "Moong dal"),
+    ("Jowar", "Paneer"),
+    ("Bajra", "Chana"),
+    ("Brown rice", "Rajma"),
+    ("Oats", "Masoor dal"),
+    ("Dalia (broken wheat)", "Soya chunks"),
+    ("Quinoa", "Curd and Chhole"),
+]
+
+def _extract_report_metrics(report_text: str):
+    extraction_prompt = f"""You are a medical data extraction specialist. Extract clinical metrics from this lab report text.
+    Lab Report Text:
+    {report_text}
+    Extract the age, glucose level, and BMI."""
+    return llm.with_structured_output(ExtractionSchema).invoke(extraction_prompt)
+
 # --- NODES ---
 
 def report_parser_node(state: AgentState):
     """Processes raw text from a PDF and extracts metrics using structured output."""
-    raw_text = state.get("report_text", "")
+    # report_text holds a blob-store reference; the text itself is never checkpointed
+    raw_text = resolve_blob(state.get("report_text")) or ""
     
     if not raw_text or len(raw_text.strip()) == 0:
         return {
@@ -36,14 +80,19 @@ def report_parser_node(state: AgentState):
             "report_text": None,
         }
     
-    extraction_prompt = f"""You are a medical data extraction specialist. Extract clinical metrics from this lab report text.
-    Lab Report Text:
-    {raw_text}
-    Extract the age, glucose level, and BMI."""
-    
-    extractor = llm.with_structured_output(ExtractionSchema)
+    # Only the metric-relevant sections go to the LLM; fall back to the full text
+    # only for missing fields whose candidate lines were pruned away (most reports
+    # have no BMI at all, which shouldn't cost a second call)
+    focused_text = select_relevant_sections(raw_text, token_budget=report_token_budget)
     try:
-        extracted = extractor.invoke(extraction_prompt)
+        extracted = _extract_report_metrics(focused_text)
+        missing = [k for k in ["age", "glucose", "bmi"] if getattr(extracted, k) is None]
+        retry = fields_dropped_by_pruning(raw_text, focused_text, missing) if missing and focused_text != raw_text else []
+        if retry:
+            print(f"[DEBUG parser] Missing {retry} from pruned text, retrying with full report")
+            full = _extract_report_metrics(raw_text)
+            for k in retry:
+                setattr(extracted, k, getattr(full, k))
     except Exception as e:
         return {
             "messages": [("assistant", f"⚠️ Error extracting data from PDF: {str(e)}")],
@@ -106,46 +155,171 @@ def guardrail_node(state: AgentState):
         return {"messages": [("assistant", msg)], "guardrail_status": "fail"}
     return {"guardrail_status": "pass"}
 
-def predictor_node(state: AgentState):
+def predictor_node(state: AgentState, config: RunnableConfig):
     """Runs the Scikit-Learn Random Forest model."""
-    result = run_diabetes_prediction(state["metrics"])
+    # Reuse the prediction prefetched during the HITL pause if the metrics didn't change
+    thread_id = config["configurable"]["thread_id"]
+    result = get_speculation(thread_id, state["metrics"], "prediction")
+    if result is None:
+        result = run_diabetes_prediction(state["metrics"])
     return {"prediction_result": result}
 
-def diet_planner_node(state: AgentState):
-    """
-    ADVANCED RAG: Generates a plan grounded in local medical guidelines (PDF data).
-    """
-    risk = state["prediction_result"]
-    m = state.get("metrics", {})
+def _guidelines_query(m: dict) -> str:
     glucose_val = m.get("glucose", "High")
-    
-    # 1. RETRIEVAL STEP: Fetch facts from your Vector DB (GI Chart, ICMR guidelines)
-    # This search query triggers the lookup tool we built in tools.py
-    search_query = f"Indian vegetarian diet guidelines and Glycemic Index for glucose level {glucose_val}"
-    clinical_guidelines = lookup_medical_guidelines.invoke(search_query)
-    
-    # 2. GENERATION STEP: Ground the LLM with the retrieved facts
-    prompt = f"""
-    You are a Senior Indian Dietician. Create a 7-day Indian Vegetarian Diabetes Plan.
-    
+    return f"Indian vegetarian diet guidelines and Glycemic Index for glucose level {glucose_val}"
+
+def _plan_profile(risk: str, m: dict, clinical_guidelines: str) -> str:
+    return f"""
     CLINICAL GUIDELINES (Retrieved from knowledge base):
     {clinical_guidelines}
     
     USER PROFILE:
     - Risk Assessment: {risk}
     - Age: {m.get('age')} | Glucose: {m.get('glucose')} | BMI: {m.get('bmi')}
-    
+    """
+
+def _generate_week_table(risk: str, m: dict, clinical_guidelines: str) -> str:
+    """Grounds the LLM with the retrieved facts and returns the plan as Markdown."""
+    prompt = f"""
+    You are a Senior Indian Dietician. Create a 7-day Indian Vegetarian Diabetes Plan.
+    {_plan_profile(risk, m, clinical_guidelines)}
     Requirements:
     1. Output a Markdown table (Day | Breakfast | Lunch | Dinner | Snacks).
     2. Use Indian meals (Ragi, Poha, Paneer, Dals, Sabzi).
     3. You MUST justify at least 2 meal choices using the CLINICAL GUIDELINES provided above (e.g., mentioning specific Glycemic Index values).
     4. Focus on low-GI items mentioned in the guidelines.
     """
+    return llm.invoke(prompt).content
+
+def _day_prompt(day_index: int, profile: str, avoid: dict) -> str:
+    grain, protein = DAY_THEMES[day_index % len(DAY_THEMES)]
+    avoid_lines = "\n".join(f"    - {slot.capitalize()}: {', '.join(meals)}" for slot, meals in avoid.items() if meals)
+    avoid_rule = f"5. Do NOT repeat these meals already used on other days:\n{avoid_lines}" if avoid_lines else ""
+    return f"""
+    You are a Senior Indian Dietician planning DAY {day_index + 1} of a 7-day Indian Vegetarian Diabetes Plan.
+    {profile}
+    Requirements:
+    1. Give one Indian vegetarian Breakfast, Lunch, Dinner and Snacks for this day.
+    2. Build the day around {grain} and {protein} so the week stays varied.
+    3. Focus on low-GI items mentioned in the guidelines.
+    4. Justify one meal choice using the CLINICAL GUIDELINES above (e.g., a specific Glycemic Index value).
+    {avoid_rule}
+    """
+
+# Meal names are compared on their main dish so "Ragi dosa with chutney" and
+# "2 ragi dosas + sambar" count as the same breakfast
+_MAIN_DISH_SPLIT = re.compile(r"\s+(?:with|and|served|topped)\s+|[,(+&;/]")
+_DISH_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "small", "medium", "large", "bowl", "cup", "cups",
+    "plate", "glass", "piece", "pieces", "serving", "portion", "homemade", "fresh", "plain",
+}
+
+def _main_dish_tokens(meal: str) -> frozenset:
+    main = _MAIN_DISH_SPLIT.split(meal.lower(), maxsplit=1)[0]
+    words = re.findall(r"[a-z]+", main)
+    # Crude singularization: "dosas" -> "dosa", "idlis" -> "idli"
+    return frozenset(w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in _DISH_STOPWORDS)
+
+def _same_dish(a: frozenset, b: frozenset) -> bool:
+    # Token overlap (Jaccard) rather than equality: "Vegetable poha" repeats "Poha"
+    return bool(a and b) and len(a & b) / len(a | b) >= 0.5
+
+def _find_repeats(days) -> dict:
+    """Returns {day index: [slots]} for every day whose meal repeats an earlier day's main dish."""
+    repeats = {}
+    for slot in MEAL_SLOTS:
+        seen = []
+        for i, day in enumerate(days):
+            key = _main_dish_tokens(day[slot])
+            if any(_same_dish(key, other) for other in seen):
+                repeats.setdefault(i, []).append(slot)
+            seen.append(key)
+    return repeats
+
+def _generate_structured_week(risk: str, m: dict, clinical_guidelines: str, on_day=None) -> dict:
+    """
+    Generates the week as day x meal-slot data with one concurrent LLM call per day.
+    All calls share the retrieved guidelines; days that repeat another day's main
+    dish are regenerated once with the other days' meals excluded.
+    """
+    profile = _plan_profile(risk, m, clinical_guidelines)
+    planner = llm.with_structured_output(DayPlanSchema)
+    days = [None] * 7
+
+    def run(indices, avoid_for):
+        prompts = [_day_prompt(i, profile, avoid_for(i)) for i in indices]
+        for pos, day in planner.batch_as_completed(prompts, config={"max_concurrency": len(prompts)}):
+            i = indices[pos]
+            days[i] = {"day": f"Day {i + 1}", **day.model_dump()}
+            if on_day:
+                on_day(i, days[i])
+
+    run(list(range(7)), lambda i: {})
+
+    # Variety constraint: a main dish may appear on only one day per slot
+    repeats = _find_repeats(days)
+    if repeats:
+        print(f"[DEBUG planner] Regenerating days {sorted(d + 1 for d in repeats)} for variety")
+        run(sorted(repeats), lambda i: {
+            slot: [d[slot] for j, d in enumerate(days) if j != i] for slot in MEAL_SLOTS
+        })
+        # Only one retry: report what is still repeated rather than looping on the LLM
+        remaining = _find_repeats(days)
+        if remaining:
+            print(f"[DEBUG planner] Repeats remain after regeneration: "
+                  f"{ {f'Day {d + 1}': slots for d, slots in sorted(remaining.items())} }")
+
+    return {"days": days}
+
+def _generate_diet_plan(risk: str, m: dict, clinical_guidelines: str, on_day=None):
+    """Returns a structured plan dict in parallel mode, or Markdown text in single mode."""
+    if planner_mode == "single":
+        return _generate_week_table(risk, m, clinical_guidelines)
+    return _generate_structured_week(risk, m, clinical_guidelines, on_day=on_day)
+
+def prefetch_analysis(thread_id: str, metrics: dict):
+    """
+    SPECULATIVE MODE: Starts prediction and guideline retrieval (and the plan draft when
+    SPECULATIVE_PLAN is enabled) while the graph waits at the HITL interrupt.
+    predictor_node / diet_planner_node pick the results up only if the confirmed
+    metrics match; otherwise the prefetch is discarded.
+    """
+    stages = [
+        ("prediction", lambda m, done: run_diabetes_prediction(m)),
+        ("guidelines", lambda m, done: lookup_medical_guidelines.invoke(_guidelines_query(m))),
+    ]
+    if speculative_plan:
+        stages.append(("plan", lambda m, done: _generate_diet_plan(done["prediction"], m, done["guidelines"])))
+    start_speculation(thread_id, metrics, stages)
+
+def diet_planner_node(state: AgentState, config: RunnableConfig):
+    """
+    ADVANCED RAG: Generates a plan grounded in local medical guidelines (PDF data).
+    """
+    risk = state["prediction_result"]
+    m = state.get("metrics", {})
+    thread_id = config["configurable"]["thread_id"]
     
-    response = llm.invoke(prompt)
-    full_report = f"### 🩺 Assessment Result: {risk}\n\n{response.content}"
+    # 1. RETRIEVAL STEP: Fetch facts from your Vector DB (GI Chart, ICMR guidelines)
+    # This search query triggers the lookup tool we built in tools.py
+    clinical_guidelines = get_speculation(thread_id, m, "guidelines")
+    if clinical_guidelines is None:
+        clinical_guidelines = lookup_medical_guidelines.invoke(_guidelines_query(m))
+    
+    # 2. GENERATION STEP: Use the speculative draft if one was made for these metrics
+    plan = get_speculation(thread_id, m, "plan")
+    if plan is None:
+        # Stream each day to the UI (stream_mode="custom") as soon as it finishes
+        writer = get_stream_writer()
+        plan = _generate_diet_plan(
+            risk, m, clinical_guidelines,
+            on_day=lambda i, day: writer({"plan_day": day, "day_index": i})
+        )
+    discard_speculation(thread_id)
+    full_report = f"### 🩺 Assessment Result: {risk}\n\n{render_diet_plan_markdown(plan)}"
     
+    # Keep the plan out of the checkpoints; state only stores its blob reference
     return {
         "messages": [("assistant", full_report)],
-        "diet_plan": response.content 
-    }
\ No newline at end of file
+        "diet_plan": put_blob(dump_diet_plan(plan), thread_id)
+    }
@@ -1,7 +1,11 @@
 from fpdf import FPDF
 from datetime import datetime
+import json
 import re
 
+# Meal slots of a structured plan: {"days": [{"day", "breakfast", ..., "justification"}]}
+MEAL_SLOTS = ["breakfast", "lunch", "dinner", "snacks"]
+
 class DiabetesReport(FPDF):
     def header(self):
         # Header with professional title
@@ -26,6 +30,33 @@ def sanitize_text(text):
     # Strips everything that isn't a standard keyboard character
     return re.sub(r'[^\x00-\x7F]+', '', text)
 
+def load_diet_plan(text):
+    """Structured plans are stored as JSON; legacy single-completion plans as Markdown text."""
+    if isinstance(text, str) and text.lstrip().startswith("{"):
+        try:
+            plan = json.loads(text)
+            if isinstance(plan, dict) and "days" in plan:
+                return plan
+        except ValueError:
+            pass
+    return text
+
+def dump_diet_plan(plan) -> str:
+    return json.dumps(plan) if isinstance(plan, dict) else plan
+
+def render_diet_plan_markdown(plan) -> str:
+    """Renders a structured plan as the Day | Breakfast | Lunch | Dinner | Snacks table."""
+    if not isinstance(plan, dict):
+        return plan or ""
+    rows = ["| Day | Breakfast | Lunch | Dinner | Snacks |", "|---|---|---|---|---|"]
+    for day in plan["days"]:
+        cells = [str(day.get(slot, "")).replace("|", "/") for slot in MEAL_SLOTS]
+        rows.append(f"| {day['day']} | " + " | ".join(cells) + " |")
+    notes = [f"- **{day['day']}:** {day['justification']}" for day in plan["days"] if day.get("justification")]
+    if notes:
+        rows += ["", "**Why these choices (from the clinical guidelines):**"] + notes
+    return "\n".join(rows)
+
 def generate_pdf_report(metrics, result, advice, diet_plan=None):
     """Generates a professional PDF containing metrics, ML results, and the diet plan."""
     pdf = DiabetesReport()
@@ -68,9 +99,22 @@ def generate_pdf_report(metrics, result, advice, diet_plan=None):
         pdf.ln(2)
         
         pdf.set_font('Helvetica', '', 10)
-        # Clean markdown table symbols for a cleaner PDF look
-        clean_plan = diet_plan.replace('|', ' ').replace('-', '').replace('#', '').strip()
-        pdf.multi_cell(0, 7, sanitize_text(clean_plan))
+        if isinstance(diet_plan, dict):
+            # Structured plan: one block per day, no markdown to strip
+            for day in diet_plan["days"]:
+                pdf.set_font('Helvetica', 'B', 10)
+                pdf.cell(0, 7, sanitize_text(day["day"]), 0, 1)
+                pdf.set_font('Helvetica', '', 10)
+                for slot in MEAL_SLOTS:
+                    pdf.multi_cell(0, 6, sanitize_text(f"   {slot.capitalize()}: {day.get(slot, '')}"), new_x="LMARGIN", new_y="NEXT")
+                if day.get("justification"):
+                    pdf.set_font('Helvetica', 'I', 9)
+                    pdf.multi_cell(0, 6, sanitize_text(f"   Why: {day['justification']}"), new_x="LMARGIN", new_y="NEXT")
+                pdf.ln(2)
+        else:
+            # Clean markdown table symbols for a cleaner PDF look
+            clean_plan = diet_plan.replace('|', ' ').replace('-', '').replace('#', '').strip()
+            pdf.multi_cell(0, 7, sanitize_text(clean_plan))
     else:
         # Fallback to general advice if no specific plan was generated
         pdf.set_font('Helvetica', 'B', 12)
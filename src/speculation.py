@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Speculative execution while the graph is parked at the HITL interrupt.
+# Work for a thread is keyed by a fingerprint of the metrics it was started with;
+# a result is only handed out if the confirmed metrics match exactly.
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculate")
+_lock = threading.Lock()
+_pending = {}   # thread_id -> _Speculation
+
+# Sessions abandoned at the interrupt never collect their prefetch; drop it after this long
+SPECULATION_TTL_SECONDS = int(os.getenv("SPECULATION_TTL_SECONDS", 30 * 60))
+
+
+class _Speculation:
+    def __init__(self, fingerprint, stage_names):
+        self.fingerprint = fingerprint
+        self.stages = {name: Future() for name in stage_names}
+        self.cancelled = threading.Event()
+        self.started = time.monotonic()
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.stages.values():
+            future.cancel()
+
+
+def metrics_fingerprint(metrics: dict) -> str:
+    return json.dumps(metrics or {}, sort_keys=True, default=str)
+
+
+def _run_stages(spec, metrics, stages):
+    """Runs the stages in order; each one sees the results of the stages before it."""
+    results = {}
+    for name, fn in stages:
+        future = spec.stages[name]
+        if spec.cancelled.is_set() or not future.set_running_or_notify_cancel():
+            return
+        try:
+            results[name] = fn(metrics, results)
+            future.set_result(results[name])
+        except Exception as e:
+            print(f"[DEBUG speculation] Stage '{name}' failed: {e}")
+            future.set_exception(e)
+            for later in spec.stages.values():
+                later.cancel()
+            return
+
+
+def _expire_stale():
+    """Cancels and forgets runs older than SPECULATION_TTL_SECONDS. Caller holds _lock."""
+    cutoff = time.monotonic() - SPECULATION_TTL_SECONDS
+    for thread_id in [t for t, spec in _pending.items() if spec.started < cutoff]:
+        _pending.pop(thread_id).cancel()
+
+
+def start_speculation(thread_id: str, metrics: dict, stages):
+    """
+    Starts `stages` ([(name, fn(metrics, results))]) in the background for these metrics.
+    Idempotent for unchanged metrics; different metrics cancel and replace the old run.
+    """
+    fingerprint = metrics_fingerprint(metrics)
+    with _lock:
+        _expire_stale()
+        current = _pending.get(thread_id)
+        if current and current.fingerprint == fingerprint and not current.cancelled.is_set():
+            return
+        if current:
+            current.cancel()
+        spec = _Speculation(fingerprint, [name for name, _ in stages])
+        _pending[thread_id] = spec
+    print(f"[DEBUG speculation] Prefetching {list(spec.stages)} for thread {thread_id}")
+    _executor.submit(_run_stages, spec, dict(metrics), stages)
+
+
+def get_speculation(thread_id: str, metrics: dict, stage: str):
+    """
+    Returns the speculative result of `stage` if it was computed for exactly these
+    metrics (waiting for it if already running). A stage still queued behind other
+    threads' work is cancelled instead, and None tells the caller to compute it inline.
+    """
+    with _lock:
+        _expire_stale()
+        spec = _pending.get(thread_id)
+    if spec is None or stage not in spec.stages:
+        return None
+    if spec.fingerprint != metrics_fingerprint(metrics):
+        print(f"[DEBUG speculation] Metrics changed for thread {thread_id}, discarding prefetch")
+        discard_speculation(thread_id)
+        return None
+    future = spec.stages[stage]
+    # cancel() only succeeds if the stage hasn't started; running/finished stages are awaited
+    if future.cancel():
+        print(f"[DEBUG speculation] Stage '{stage}' not started for thread {thread_id}, computing inline")
+        return None
+    try:
+        return future.result()
+    except Exception:
+        return None
+
+
+def discard_speculation(thread_id: str):
+    with _lock:
+        spec = _pending.pop(thread_id, None)
+    if spec:
+        spec.cancel()
@@ -11,7 +11,8 @@ class AgentState(TypedDict):
     metrics: Dict[str, Optional[float]] 
     
     # 3. Multimodal Data
-    # Stores the raw text extracted from an uploaded PDF report
+    # Blob-store reference ("blob:sha256:...") to the raw text extracted from an
+    # uploaded PDF report; resolve with src.blob_store.resolve_blob
     report_text: Optional[str]
     
     # 4. Analysis Results
@@ -21,7 +22,7 @@ class AgentState(TypedDict):
     prediction_result: Optional[str]
     
     # 5. Personalized Outputs
-    # Stores the generated 7-Day Indian Vegetarian Diet Plan
+    # Blob-store reference to the generated 7-Day Indian Vegetarian Diet Plan
     diet_plan: Optional[str]
     # Stores fallback research data if needed
     search_data: Optional[str]
\ No newline at end of file
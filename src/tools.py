@@ -1,12 +1,14 @@
 import os
 import pickle
+import threading
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from pathlib import Path
 from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.tools import tool
+from src.embeddings import create_embeddings
 
 # --- Configuration & Environment ---
 os.environ["HF_HOME"] = "D:/huggingface_cache"
@@ -25,21 +27,25 @@ try:
         model_data = pickle.load(f)
     scaler = model_data["scaler"]
     diabetes_model = model_data["model"]
+    # Artifacts built by train.py carry their version, params and metrics
+    model_metadata = model_data.get("metadata", {})
+    if model_metadata:
+        print(f"[DEBUG tools] Loaded diabetes model {model_metadata.get('version')} {model_metadata.get('params')}")
 except (FileNotFoundError, OSError):
     scaler = None
     diabetes_model = None
+    model_metadata = {}
 
 
 # --- Tool 1: ML Prediction Tool ---
-def run_diabetes_prediction(metrics: dict):
-    """
-    Processes extracted metrics, scales them, and returns ML prediction probability.
-    """
-    if not diabetes_model or not scaler:
-        return "Model not loaded. Please check data/diabetes_model.pkl"
+FEATURE_NAMES = [
+    "Pregnancies", "Glucose", "BloodPressure", "SkinThickness", 
+    "Insulin", "BMI", "DiabetesPedigreeFunction", "Age"
+]
 
-    # Mapping extracted names to clinical dataset features
-    raw_features = [
+def _build_feature_row(metrics: dict):
+    """Maps extracted metric names to the clinical dataset feature order."""
+    return [
         float(metrics.get("pregnancies", 0)),
         float(metrics.get("glucose", 0)),
         float(metrics.get("blood_pressure", 72)), 
@@ -50,12 +56,14 @@ def run_diabetes_prediction(metrics: dict):
         float(metrics.get("age", 0))
     ]
 
-    feature_names = [
-        "Pregnancies", "Glucose", "BloodPressure", "SkinThickness", 
-        "Insulin", "BMI", "DiabetesPedigreeFunction", "Age"
-    ]
-    
-    input_df = pd.DataFrame([raw_features], columns=feature_names)
+def run_diabetes_prediction(metrics: dict):
+    """
+    Processes extracted metrics, scales them, and returns ML prediction probability.
+    """
+    if not diabetes_model or not scaler:
+        return "Model not loaded. Please check data/diabetes_model.pkl"
+
+    input_df = pd.DataFrame([_build_feature_row(metrics)], columns=FEATURE_NAMES)
 
     # Scale and Predict
     input_scaled = scaler.transform(input_df)
@@ -66,6 +74,82 @@ def run_diabetes_prediction(metrics: dict):
     return f"{status} ({round(prob * 100, 2)}% probability)"
 
 
+# --- Tool 1b: What-If Risk Sensitivity ---
+def run_risk_sensitivity(metrics: dict, glucose_span=40, bmi_span=8, steps=50, ages=None):
+    """
+    Scores a Glucose x BMI grid (optionally x Age) around the patient's current metrics
+    in a single vectorized forest evaluation. Results are cached per patient profile.
+
+    Returns a dict with the 'glucose', 'bmi' and 'age' axes and 'probability' (%),
+    shaped (glucose, bmi) or (age, glucose, bmi) when `ages` is given. None if no model.
+    """
+    if not diabetes_model or not scaler:
+        return None
+
+    base_row = tuple(_build_feature_row(metrics))
+    age_key = tuple(float(a) for a in ages) if ages is not None else None
+    return _score_sensitivity_grid(base_row, float(glucose_span), float(bmi_span), int(steps), age_key)
+
+@lru_cache(maxsize=256)
+def _score_sensitivity_grid(base_row, glucose_span, bmi_span, steps, ages):
+    base = np.asarray(base_row, dtype=float)
+    glucose, bmi, age = base[1], base[5], base[7]
+
+    # Stay inside the ranges the guardrail node accepts as realistic
+    glucose_axis = np.linspace(max(30.0, glucose - glucose_span), min(600.0, glucose + glucose_span), steps)
+    bmi_axis = np.linspace(max(10.0, bmi - bmi_span), min(70.0, bmi + bmi_span), steps)
+    age_axis = np.asarray(ages if ages is not None else (age,), dtype=float)
+
+    age_grid, glucose_grid, bmi_grid = np.meshgrid(age_axis, glucose_axis, bmi_axis, indexing="ij")
+    grid = np.tile(base, (age_grid.size, 1))
+    grid[:, 1] = glucose_grid.ravel()
+    grid[:, 5] = bmi_grid.ravel()
+    grid[:, 7] = age_grid.ravel()
+
+    # One scaler pass and one forest pass for the whole grid
+    grid_scaled = scaler.transform(pd.DataFrame(grid, columns=FEATURE_NAMES))
+    probability = diabetes_model.predict_proba(grid_scaled)[:, 1].reshape(age_grid.shape) * 100
+    if ages is None:
+        probability = probability[0]
+
+    # Cached arrays are shared between callers, so freeze them
+    for arr in (glucose_axis, bmi_axis, age_axis, probability):
+        arr.setflags(write=False)
+    return {"glucose": glucose_axis, "bmi": bmi_axis, "age": age_axis, "probability": probability}
+
+
+# --- Shared Retrieval Resources ---
+# Loaded once per process and reused by every query. Under serve.py the embedding
+# weights are loaded in the prefork parent; the Chroma client is always opened per worker.
+_embeddings = None
+_vector_db = None
+# Background prefetch (src/speculation.py) can race the first request to load these
+_resources_lock = threading.RLock()
+
+def get_embeddings():
+    global _embeddings
+    if _embeddings is not None:
+        return _embeddings
+    with _resources_lock:
+        if _embeddings is None:
+            # Initialize embeddings using your custom cache path (torch or ONNX, see EMBEDDING_BACKEND)
+            _embeddings = create_embeddings()
+        return _embeddings
+
+def get_vector_db():
+    """Returns the persisted Chroma index, or None if ingest.py hasn't been run."""
+    global _vector_db
+    if _vector_db is not None:
+        return _vector_db
+    with _resources_lock:
+        if _vector_db is None and os.path.exists(DB_DIR):
+            _vector_db = Chroma(
+                persist_directory=DB_DIR,
+                embedding_function=get_embeddings()
+            )
+        return _vector_db
+
+
 # --- Tool 2: Agentic RAG Tool (Vector DB Search) ---
 @tool
 def lookup_medical_guidelines(query: str) -> str:
@@ -74,17 +158,10 @@ def lookup_medical_guidelines(query: str) -> str:
     Indian food database, and clinical diabetes guidelines.
     """
     try:
-        # Initialize embeddings using your custom cache path
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        
-        if not os.path.exists(DB_DIR):
-            return "Knowledge base not initialized. Run ingest.py first."
-
         # Load the existing Vector DB
-        vector_db = Chroma(
-            persist_directory=DB_DIR,
-            embedding_function=embeddings
-        )
+        vector_db = get_vector_db()
+        if vector_db is None:
+            return "Knowledge base not initialized. Run ingest.py first."
         
         # Retrieve top 3 relevant chunks
         docs = vector_db.similarity_search(query, k=3)
@@ -95,4 +172,4 @@ def lookup_medical_guidelines(query: str) -> str:
         context = "\n\n".join([f"Guideline: {d.page_content}" for d in docs])
         return context
     except Exception as e:
-        return f"Error retrieving medical data: {str(e)}"
\ No newline at end of file
+        return f"Error retrieving medical data: {str(e)}"
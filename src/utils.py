@@ -1,6 +1,7 @@
 import io
 import re
 import numpy as np
+from typing import Callable, Optional
 
 # Digital Extraction Engines
 try:
@@ -24,23 +25,161 @@ try:
 except ImportError:
     easyocr = None
 
+class _NonPrintableTable(dict):
+    """
+    str.translate table deleting every codepoint where not chr(c).isprintable()
+    (except newline, tab and space). Entries are filled in the first time a codepoint
+    is seen, so the table matches isprintable() exactly without materializing all
+    ~1M non-printable codepoints up front.
+    """
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        self[codepoint] = None if not char.isprintable() and char not in "\n\t " else codepoint
+        return self[codepoint]
+
+_NON_PRINTABLE_TABLE = _NonPrintableTable()
+# Non-breaking and other Unicode spaces are mapped to a plain space first so words don't get glued together
+_UNICODE_SPACES = re.compile(r"[\u00a0\u1680\u2000-\u200a\u202f\u205f\u3000]")
+_TRAILING_SPACES = re.compile(r"[ \t]+$", re.MULTILINE)
+
 def clean_extracted_text(text: str) -> str:
     """Sanitizes text for LLM processing."""
     if not text:
         return ""
     # Remove null bytes and non-printable characters
-    text = "".join(char for char in text if char.isprintable() or char in "\n\t ")
-    # Normalize spaces
+    text = _UNICODE_SPACES.sub(" ", text)
+    text = text.translate(_NON_PRINTABLE_TABLE)
+    # Drop layout padding at line ends, then normalize spaces
+    text = _TRAILING_SPACES.sub("", text)
     text = re.sub(r'[ \t]+', ' ', text)
     # Clean up excessive newlines
     text = re.sub(r'\n{3,}', '\n\n', text)
     return text.strip()
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+def iter_clean_pages(pages):
+    """Streams cleaned pages one at a time so only a single raw page is held in memory."""
+    for page_text in pages:
+        cleaned = clean_extracted_text(page_text)
+        if cleaned:
+            yield cleaned
+
+# --- Relevance Pruning (runs before the LLM extraction prompt) ---
+REPORT_TOKEN_BUDGET = 600
+
+# Keywords that mark a line as a candidate for each extracted metric
+_FIELD_KEYWORDS = {
+    "age": r"age|years?|yrs?|dob|date\s+of\s+birth",
+    "glucose": r"glucose|sugar|fbs|ppbs|rbs|fasting|post\s*prandial|random|hba1c|a1c|glycated",
+    "bmi": r"bmi|body\s*mass",
+}
+_FIELD_PATTERNS = {field: re.compile(rf"\b({kw})\b", re.IGNORECASE) for field, kw in _FIELD_KEYWORDS.items()}
+_METRIC_KEYWORDS = re.compile(
+    r"\b(" + "|".join(_FIELD_KEYWORDS.values()) + r"|weight|height|sex|gender)\b",
+    re.IGNORECASE,
+)
+_METRIC_UNITS = re.compile(r"(mg\s*/\s*dl|mmol\s*/\s*l|kg\s*/\s*m\s*2|kg/m²|\bkgs?\b|\bcms?\b|%)", re.IGNORECASE)
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_CONTEXT_LINE_CHARS = 80
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting."""
+    return len(text) // 4 + 1
+
+def _score_line(line: str) -> float:
+    """Scores a line for metric relevance from lab keywords, units and numeric density."""
+    keywords = len(_METRIC_KEYWORDS.findall(line))
+    if not keywords and not _METRIC_UNITS.search(line):
+        return 0.0
+    numbers = _NUMBER.findall(line)
+    density = sum(len(n) for n in numbers) / max(len(line), 1)
+    return 3.0 * keywords + 2.0 * len(_METRIC_UNITS.findall(line)) + min(len(numbers), 3) + 5.0 * density
+
+def select_relevant_sections(text: str, token_budget: int = REPORT_TOKEN_BUDGET, window: int = 1) -> str:
+    """
+    Keeps only the report sections most likely to hold Age, Glucose and BMI.
+    Lines are scored individually, each scoring line is expanded into a +/- `window`
+    context window, and the best windows are kept (in document order) until the
+    token budget is spent. Returns the text unchanged if it already fits.
+    """
+    if not text or estimate_tokens(text) <= token_budget:
+        return text or ""
+
+    lines = text.splitlines()
+    scores = [_score_line(line) for line in lines]
+    windows = []
+    for i, score in enumerate(scores):
+        if score <= 0:
+            continue
+        lo, hi = max(0, i - window), min(len(lines), i + window + 1)
+        windows.append((sum(scores[lo:hi]), lo, hi))
+
+    selected, seen, used = set(), set(), 0
+    for _, lo, hi in sorted(windows, key=lambda w: -w[0]):
+        new_lines = [
+            j for j in range(lo, hi)
+            if j not in selected and lines[j].strip() not in seen
+            # Unscored neighbours are only kept as short context (panel titles, column headers)
+            and (scores[j] > 0 or len(lines[j]) <= _CONTEXT_LINE_CHARS)
+        ]
+        cost = sum(estimate_tokens(lines[j]) for j in new_lines)
+        if used + cost > token_budget:
+            continue
+        for j in new_lines:
+            selected.add(j)
+            # Repeated page headers/disclaimers only need to appear once
+            seen.add(lines[j].strip())
+        used += cost
+
+    if not selected:
+        return text[: token_budget * 4]
+
+    sections, prev = [], None
+    for j in sorted(selected):
+        if prev is not None and j != prev + 1:
+            sections.append("...")
+        sections.append(lines[j])
+        prev = j
+    return "\n".join(sections)
+
+def fields_dropped_by_pruning(full_text: str, pruned_text: str, fields) -> list:
+    """
+    Returns the `fields` ("age", "glucose", "bmi") that have candidate lines in
+    `full_text` which select_relevant_sections left out. A field with no such line
+    simply isn't in the report, and re-reading the full text won't find it.
+    """
+    kept = {line.strip() for line in pruned_text.splitlines()}
+    dropped = [line for line in full_text.splitlines() if line.strip() not in kept]
+    return [f for f in fields if any(_FIELD_PATTERNS[f].search(line) for line in dropped)]
+
+class ExtractionCancelled(Exception):
+    """Raised from an `on_page` callback to abort extraction (e.g. a cancelled job)."""
+
+def _with_progress(pages, total, on_page):
+    """Reports (pages_done, pages_total) after each page is pulled through the pipeline."""
+    for i, page_text in enumerate(pages):
+        yield page_text
+        if on_page:
+            on_page(i + 1, total)
+
+def _iter_pdfplumber_pages(pdf):
+    for page in pdf.pages:
+        yield page.extract_text(layout=True)
+        # Release the parsed layout objects before moving to the next page
+        page.flush_cache()
+
+def _iter_pdfium_pages(pdf):
+    for page in pdf:
+        tp = page.get_textpage()
+        yield tp.get_text_range()
+        tp.close()
+        page.close()
+
+def extract_text_from_pdf(file_bytes: bytes, on_page: Optional[Callable[[int, int], None]] = None) -> str:
     """
     Advanced Multi-Engine Extraction.
     Digital: pdfplumber > pypdfium2 > PyPDF2
     Fallback: EasyOCR (No external Tesseract software needed).
+    `on_page(done, total)` is called per page; it may raise ExtractionCancelled to stop.
     """
     if not file_bytes:
         return ""
@@ -53,11 +192,13 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
         try:
             pdf_file.seek(0)
             with pdfplumber.open(pdf_file) as pdf:
-                pages = [page.extract_text(layout=True) for page in pdf.pages]
-                text = "\n".join(filter(None, pages))
+                pages = _with_progress(_iter_pdfplumber_pages(pdf), len(pdf.pages), on_page)
+                text = "\n".join(iter_clean_pages(pages))
             if text.strip():
                 print(f"[DEBUG utils] Extracted {len(text)} chars via pdfplumber")
-                return clean_extracted_text(text)
+                return text
+        except ExtractionCancelled:
+            raise
         except Exception: 
             pass
 
@@ -65,17 +206,14 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
         try:
             pdf_file.seek(0)
             pdf = pypdfium2.PdfDocument(pdf_file)
-            pages = []
-            for page in pdf:
-                tp = page.get_textpage()
-                pages.append(tp.get_text_range())
-                tp.close()
-                page.close()
+            pages = _with_progress(_iter_pdfium_pages(pdf), len(pdf), on_page)
+            text = "\n".join(iter_clean_pages(pages))
             pdf.close()
-            text = "\n".join(filter(None, pages))
             if text.strip():
                 print(f"[DEBUG utils] Extracted {len(text)} chars via pypdfium2")
-                return clean_extracted_text(text)
+                return text
+        except ExtractionCancelled:
+            raise
         except Exception: 
             pass
 
@@ -83,11 +221,13 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
         try:
             pdf_file.seek(0)
             reader = PyPDF2.PdfReader(pdf_file)
-            pages = [p.extract_text() for p in reader.pages]
-            text = "\n".join(filter(None, pages))
+            pages = _with_progress((p.extract_text() for p in reader.pages), len(reader.pages), on_page)
+            text = "\n".join(iter_clean_pages(pages))
             if text.strip():
                 print(f"[DEBUG utils] Extracted {len(text)} chars via PyPDF2")
-                return clean_extracted_text(text)
+                return text
+        except ExtractionCancelled:
+            raise
         except Exception: 
             pass
 
@@ -102,7 +242,8 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
             pdf = pypdfium2.PdfDocument(file_bytes)
             ocr_pages = []
             
-            for page in pdf:
+            total = len(pdf)
+            for page_no, page in enumerate(pdf, start=1):
                 # Render page to a bitmap
                 bitmap = page.render(scale=2)
                 pil_image = bitmap.to_pil()
@@ -112,16 +253,20 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
                 
                 # Perform OCR (detail=0 returns raw text string)
                 results = reader.readtext(img_array, detail=0)
-                ocr_pages.append(" ".join(results))
+                ocr_pages.extend(iter_clean_pages([" ".join(results)]))
                 
                 bitmap.close()
                 page.close()
+                if on_page:
+                    on_page(page_no, total)
             pdf.close()
             
             text = "\n".join(ocr_pages)
             if text.strip():
                 print(f"[DEBUG utils] EasyOCR Success: Extracted {len(text)} chars.")
-                return clean_extracted_text(text)
+                return text
+        except ExtractionCancelled:
+            raise
         except Exception as e:
             print(f"[ERROR utils] EasyOCR Engine failed: {e}")
 
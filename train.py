@@ -0,0 +1,214 @@
+import io
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+import itertools
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score, brier_score_loss
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+# Rebuilds data/diabetes_model.pkl ({"scaler", "model", "metadata"}) from the
+# Pima Indians Diabetes CSV and sweeps the forest size against accuracy and cost:
+#   python train.py --data data/diabetes.csv --select smallest --auc-tolerance 0.005
+
+# Must match the column order run_diabetes_prediction builds in src/tools.py
+FEATURE_NAMES = [
+    "Pregnancies", "Glucose", "BloodPressure", "SkinThickness",
+    "Insulin", "BMI", "DiabetesPedigreeFunction", "Age"
+]
+TARGET = "Outcome"
+
+# Anchored to the repo root like src/tools.py, so the promoted model is the one the app loads
+DATA_DIR = Path(__file__).resolve().parent / "data"
+MODEL_PATH = DATA_DIR / "diabetes_model.pkl"
+VERSIONS_DIR = DATA_DIR / "models"
+
+
+def parse_grid_values(text, cast):
+    return [None if v.strip().lower() == "none" else cast(v) for v in text.split(",")]
+
+
+def expected_calibration_error(y_true, prob, bins=10):
+    """Weighted gap between predicted probability and observed rate over equal-width bins."""
+    edges = np.linspace(0, 1, bins + 1)
+    idx = np.clip(np.digitize(prob, edges[1:-1]), 0, bins - 1)
+    ece = 0.0
+    for b in range(bins):
+        mask = idx == b
+        if mask.any():
+            ece += mask.mean() * abs(prob[mask].mean() - y_true[mask].mean())
+    return float(ece)
+
+
+def serialize(scaler, model, metadata=None):
+    artifact = {"scaler": scaler, "model": model}
+    if metadata is not None:
+        artifact["metadata"] = metadata
+    return pickle.dumps(artifact, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def measure_serving_cost(scaler, model, X_test, repeats=50):
+    """Latency of the same DataFrame -> scaler -> predict_proba path tools.py uses, plus artifact size/load time."""
+    row = X_test.iloc[[0]]
+    single = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict_proba(scaler.transform(row))
+        single.append((time.perf_counter() - start) * 1000)
+
+    batch = pd.concat([X_test] * int(np.ceil(1000 / len(X_test))), ignore_index=True).iloc[:1000]
+    start = time.perf_counter()
+    model.predict_proba(scaler.transform(batch))
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    blob = serialize(scaler, model)
+    start = time.perf_counter()
+    pickle.load(io.BytesIO(blob))
+    load_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "single_row_ms_p50": float(np.median(single)),
+        "batch_1000_ms": batch_ms,
+        "artifact_kb": len(blob) / 1024,
+        "load_ms": load_ms,
+        "total_nodes": int(sum(t.tree_.node_count for t in model.estimators_)),
+    }
+
+
+def fit_model(params, X_train, y_train, seed):
+    scaler = StandardScaler().fit(X_train)
+    model = RandomForestClassifier(random_state=seed, **params).fit(scaler.transform(X_train), y_train)
+    return scaler, model
+
+
+def evaluate_config(params, X_train, y_train, X_test, y_test, cv_folds, seed):
+    # Cross-validated AUC on the training split drives selection; the test split is reported only
+    cv_auc = []
+    for fit_idx, val_idx in StratifiedKFold(cv_folds, shuffle=True, random_state=seed).split(X_train, y_train):
+        scaler = StandardScaler().fit(X_train.iloc[fit_idx])
+        model = RandomForestClassifier(random_state=seed, **params)
+        model.fit(scaler.transform(X_train.iloc[fit_idx]), y_train[fit_idx])
+        cv_auc.append(roc_auc_score(y_train[val_idx], model.predict_proba(scaler.transform(X_train.iloc[val_idx]))[:, 1]))
+
+    scaler, model = fit_model(params, X_train, y_train, seed)
+    prob = model.predict_proba(scaler.transform(X_test))[:, 1]
+
+    result = {
+        "params": params,
+        "cv_auc": float(np.mean(cv_auc)),
+        "cv_auc_std": float(np.std(cv_auc)),
+        "test_auc": float(roc_auc_score(y_test, prob)),
+        "test_brier": float(brier_score_loss(y_test, prob)),
+        "test_ece": expected_calibration_error(y_test, prob),
+    }
+    result.update(measure_serving_cost(scaler, model, X_test))
+    return result
+
+
+def select(results, mode, tolerance):
+    """'best': highest CV AUC. 'smallest': smallest artifact within `tolerance` of the best CV AUC."""
+    best_auc = max(r["cv_auc"] for r in results)
+    if mode == "best":
+        return max(range(len(results)), key=lambda i: results[i]["cv_auc"])
+    candidates = [i for i, r in enumerate(results) if r["cv_auc"] >= best_auc - tolerance]
+    return min(candidates, key=lambda i: (results[i]["artifact_kb"], results[i]["single_row_ms_p50"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and benchmark the diabetes Random Forest.")
+    parser.add_argument("--data", default=str(DATA_DIR / "diabetes.csv"), help="Pima Indians Diabetes CSV (8 features + Outcome)")
+    parser.add_argument("--n-estimators", default="25,50,100,200,400")
+    parser.add_argument("--max-depth", default="4,6,8,none")
+    parser.add_argument("--min-samples-leaf", default="1,5")
+    parser.add_argument("--max-features", default="sqrt")
+    parser.add_argument("--select", choices=["smallest", "best"], default="smallest")
+    parser.add_argument("--auc-tolerance", type=float, default=0.005)
+    parser.add_argument("--cv", type=int, default=5)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-promote", action="store_true", help=f"Don't overwrite {MODEL_PATH}")
+    args = parser.parse_args()
+
+    # 1️⃣ Load data
+    data_path = Path(args.data)
+    if not data_path.exists():
+        sys.exit(f"❌ Dataset '{data_path}' not found.")
+    df = pd.read_csv(data_path)
+    missing = [c for c in FEATURE_NAMES + [TARGET] if c not in df.columns]
+    if missing:
+        sys.exit(f"❌ Dataset is missing columns: {missing}")
+    X, y = df[FEATURE_NAMES].astype(float), df[TARGET].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=args.test_size, stratify=y, random_state=args.seed
+    )
+
+    # 2️⃣ Sweep the grid
+    grid = {
+        "n_estimators": parse_grid_values(args.n_estimators, int),
+        "max_depth": parse_grid_values(args.max_depth, int),
+        "min_samples_leaf": parse_grid_values(args.min_samples_leaf, int),
+        "max_features": parse_grid_values(args.max_features, lambda v: float(v) if v.replace(".", "", 1).isdigit() else v),
+    }
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    print(f"📊 {len(df)} rows | sweeping {len(configs)} configurations")
+
+    results = []
+    header = f"{'n_est':>5} {'depth':>5} {'leaf':>4} | {'cvAUC':>6} {'tAUC':>6} {'Brier':>6} {'ECE':>5} | {'1row ms':>7} {'1k ms':>7} {'KB':>8} {'load ms':>7}"
+    print(header)
+    print("-" * len(header))
+    for params in configs:
+        result = evaluate_config(params, X_train, y_train, X_test, y_test, args.cv, args.seed)
+        results.append(result)
+        print(
+            f"{params['n_estimators']:>5} {str(params['max_depth']):>5} {params['min_samples_leaf']:>4} | "
+            f"{result['cv_auc']:.4f} {result['test_auc']:.4f} {result['test_brier']:.4f} {result['test_ece']:.3f} | "
+            f"{result['single_row_ms_p50']:7.2f} {result['batch_1000_ms']:7.1f} {result['artifact_kb']:8.0f} {result['load_ms']:7.1f}"
+        )
+
+    # 3️⃣ Pick the model
+    chosen = select(results, args.select, args.auc_tolerance)
+    # Same seed + split, so this reproduces the forest measured in the sweep
+    scaler, model = fit_model(results[chosen]["params"], X_train, y_train, args.seed)
+    best = max(results, key=lambda r: r["cv_auc"])
+    print(f"\n✅ Selected ({args.select}): {results[chosen]['params']}")
+    print(f"   CV AUC {results[chosen]['cv_auc']:.4f} vs best {best['cv_auc']:.4f} | "
+          f"{results[chosen]['artifact_kb']:.0f} KB vs {best['artifact_kb']:.0f} KB")
+
+    # 4️⃣ Write the versioned artifact + report
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{hashlib.sha256(json.dumps(results[chosen]['params'], sort_keys=True).encode()).hexdigest()[:8]}"
+    metadata = {
+        "version": version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "features": FEATURE_NAMES,
+        "params": results[chosen]["params"],
+        "metrics": {k: v for k, v in results[chosen].items() if k != "params"},
+        "selection": {"mode": args.select, "auc_tolerance": args.auc_tolerance, "cv_folds": args.cv},
+        "data": {"path": str(data_path), "rows": int(len(df)), "sha256": hashlib.sha256(data_path.read_bytes()).hexdigest()},
+        "seed": args.seed,
+        "sklearn_version": sklearn.__version__,
+    }
+    VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    artifact = serialize(scaler, model, metadata)
+    versioned_path = VERSIONS_DIR / f"diabetes_model_{version}.pkl"
+    versioned_path.write_bytes(artifact)
+    (VERSIONS_DIR / f"diabetes_model_{version}.json").write_text(
+        json.dumps({"metadata": metadata, "sweep": results}, indent=2)
+    )
+    print(f"💾 Wrote {versioned_path} (+ .json sweep report)")
+
+    if not args.no_promote:
+        MODEL_PATH.write_bytes(artifact)
+        print(f"🚀 Promoted to {MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()